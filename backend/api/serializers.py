@@ -1,19 +1,26 @@
 import base64
-import imghdr
+import binascii
 import uuid
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.files.base import ContentFile
-from django.core.paginator import Paginator
-from recipes.models import (Favorite, Ingredient, Recipe,
-                            RecipeIngredientAmount, ShoppingCart, Subscription,
-                            Tag)
+from django.utils.functional import cached_property
+from recipes.models import (Ingredient, Recipe, RecipeIngredientAmount,
+                            Subscription, Tag)
 from rest_framework import serializers
-from rest_framework.generics import get_object_or_404
 
 User = get_user_model()
 
+DEFAULT_RECIPES_LIMIT = settings.REST_FRAMEWORK['PAGE_SIZE']
+
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+)
+
 
 class UserReadSerializer(serializers.ModelSerializer):
     """
@@ -27,9 +34,17 @@ class UserReadSerializer(serializers.ModelSerializer):
                   'last_name', 'is_subscribed')
 
     def get_is_subscribed(self, obj):
+        return obj.id in self.subscribed_authors
+
+    @cached_property
+    def subscribed_authors(self):
+        """
+        Идентификаторы авторов, на которых подписан текущий пользователь.
+        """
         user = self.context['request'].user
-        return (user.is_authenticated
-                and user.subscriptions.filter(author=obj).exists())
+        if not user.is_authenticated:
+            return set()
+        return set(user.subscriptions.values_list('author_id', flat=True))
 
 
 class UserWriteSerializer(serializers.ModelSerializer):
@@ -44,8 +59,9 @@ class UserWriteSerializer(serializers.ModelSerializer):
         extra_kwargs = {'password': {'write_only': True}}
 
     def create(self, validated_data):
-        user = super().create(validated_data)
-        user.set_password(validated_data['password'])
+        password = validated_data.pop('password')
+        user = User(**validated_data)
+        user.set_password(password)
         user.save()
         return user
 
@@ -56,7 +72,7 @@ class TagSerializer(serializers.ModelSerializer):
     """
     class Meta:
         model = Tag
-        fields = '__all__'
+        fields = ('id', 'name', 'color', 'slug')
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -68,13 +84,13 @@ class IngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit')
 
 
-class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
+class RecipeIngredientAmountSerializer(serializers.Serializer):
     """
     Сериализатор модели, связывающей рецепт, ингредиент и количество.
     На чтение.
     """
     id = serializers.ReadOnlyField(
-        source='ingredient.id'
+        source='ingredient_id'
     )
     name = serializers.ReadOnlyField(
         source='ingredient.name'
@@ -82,10 +98,7 @@ class RecipeIngredientAmountSerializer(serializers.ModelSerializer):
     measurement_unit = serializers.ReadOnlyField(
         source='ingredient.measurement_unit'
     )
-
-    class Meta:
-        model = RecipeIngredientAmount
-        fields = ('id', 'name', 'measurement_unit', 'amount')
+    amount = serializers.ReadOnlyField()
 
 
 class RecipeIngredientAmountWriteSerializer(serializers.ModelSerializer):
@@ -110,8 +123,9 @@ class RecipeSerializer(serializers.ModelSerializer):
         source='recipeingredientamount',
         many=True
     )
-    is_favorited = serializers.SerializerMethodField()
-    is_in_shopping_cart = serializers.SerializerMethodField()
+    is_favorited = serializers.BooleanField(read_only=True, default=False)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True,
+                                                   default=False)
 
     class Meta:
         model = Recipe
@@ -125,18 +139,6 @@ class RecipeSerializer(serializers.ModelSerializer):
             response['image'] = instance.image.url
         return response
 
-    def get_is_favorited(self, obj):
-        user = self.context['request'].user
-        return (user.is_authenticated
-                and Favorite.objects.filter(user=user, recipe=obj).exists())
-
-    def get_is_in_shopping_cart(self, obj):
-        user = self.context['request'].user
-        return (
-            user.is_authenticated
-            and ShoppingCart.objects.filter(user=user, recipe=obj).exists()
-        )
-
 
 class Base64ImageField(serializers.ImageField):
     """
@@ -144,25 +146,29 @@ class Base64ImageField(serializers.ImageField):
     """
     def to_internal_value(self, data):
         if isinstance(data, str):
-            if 'data:' in data and ';base64,' in data:
-                header, data = data.split(';base64,')
+            if data.startswith('data:') and ';base64,' in data[:64]:
+                _, _, data = data.partition(';base64,')
 
             try:
-                decoded_file = base64.b64decode(data)
-            except TypeError:
+                decoded_file = base64.b64decode(data, validate=True)
+            except (TypeError, binascii.Error):
                 self.fail('invalid_image')
 
-            file_name = str(uuid.uuid4())
-            file_extension = self.get_file_extension(file_name, decoded_file)
+            file_name = uuid.uuid4().hex
+            file_extension = self.get_file_extension(decoded_file)
             complete_file_name = f'{file_name}.{file_extension}'
             data = ContentFile(decoded_file, name=complete_file_name)
 
         return super().to_internal_value(data)
 
-    def get_file_extension(self, file_name, decoded_file):
-        extension = imghdr.what(file_name, decoded_file)
-        extension = "jpg" if extension == "jpeg" else extension
-        return extension
+    def get_file_extension(self, decoded_file):
+        header = decoded_file[:12]
+        for signature, extension in IMAGE_SIGNATURES:
+            if header.startswith(signature):
+                return extension
+        if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+            return 'webp'
+        self.fail('invalid_image')
 
 
 class RecipeWriteSerializer(serializers.ModelSerializer):
@@ -193,12 +199,8 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         recipe = Recipe.objects.create(**validated_data)
         amounts = self.get_amounts(recipe, ingredients_data)
         RecipeIngredientAmount.objects.bulk_create(amounts)
+        recipe.tags.set(tags_data)
 
-        for tag_data in tags_data:
-            tag = get_object_or_404(Tag, id=tag_data.id)
-            recipe.tags.add(tag)
-
-        recipe.save()
         return recipe
 
     def update(self, instance, validated_data):
@@ -209,21 +211,22 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         instance.recipeingredientamount.all().delete()
         amounts = self.get_amounts(instance, ingredients_data)
         RecipeIngredientAmount.objects.bulk_create(amounts)
-
-        tags = []
-        for tag_data in tags_data:
-            tag = get_object_or_404(Tag, id=tag_data.id)
-            tags.append(tag)
-        instance.tags.set(tags)
+        instance.tags.set(tags_data)
 
         return instance
 
+    def validate_ingredients(self, value):
+        ids = [ingredient_data['id'] for ingredient_data in value]
+        ingredients = Ingredient.objects.in_bulk(ids)
+        if set(ids) - set(ingredients):
+            raise serializers.ValidationError('Ингредиент не найден.')
+        return value
+
     def get_amounts(self, recipe, ingredients_data):
         amounts = [
             RecipeIngredientAmount(
                 recipe=recipe,
-                ingredient=get_object_or_404(Ingredient,
-                                             id=ingredient_data['id']),
+                ingredient_id=ingredient_data['id'],
                 amount=ingredient_data['amount']
             )
             for ingredient_data in ingredients_data
@@ -253,35 +256,36 @@ class SubscriptionSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source='author.username')
     first_name = serializers.CharField(source='author.first_name')
     last_name = serializers.CharField(source='author.last_name')
-    is_subscribed = serializers.SerializerMethodField()
+    is_subscribed = serializers.BooleanField(read_only=True)
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = Subscription
         fields = ('email', 'id', 'username', 'first_name', 'last_name',
                   'is_subscribed', 'recipes', 'recipes_count')
 
-    def get_is_subscribed(self, obj):
-        user = self.context['request'].user
-        author = obj.author
-        return (
-            user.is_authenticated
-            and Subscription.objects.filter(user=user, author=author).exists()
-        )
-
     def get_recipes(self, obj):
+        recipes = obj.author.recipes.all()[self.recipes_slice]
+        return self.recipes_serializer.to_representation(recipes)
+
+    @cached_property
+    def recipes_slice(self):
+        """
+        Срез рецептов автора по параметрам recipes_limit и recipes_page.
+        """
         query_params = self.context['request'].query_params
-        recipes_limit = query_params.get(
-            'recipes_limit',
-            settings.REST_FRAMEWORK['PAGE_SIZE']
-        )
-        recipes_page = query_params.get('recipes_page', 1)
-
-        paginator = Paginator(obj.author.recipes.all(), recipes_limit)
-        recipes = paginator.page(recipes_page)
-        serializer = FavoriteSerializer(recipes, many=True)
-        return serializer.data
-
-    def get_recipes_count(self, obj):
-        return obj.author.recipes.all().count()
+        recipes_limit = max(int(query_params.get(
+            'recipes_limit', DEFAULT_RECIPES_LIMIT
+        )), 0)
+        recipes_page = max(int(query_params.get('recipes_page', 1)), 1)
+
+        start = (recipes_page - 1) * recipes_limit
+        return slice(start, start + recipes_limit)
+
+    @cached_property
+    def recipes_serializer(self):
+        """
+        Сериализатор рецептов автора, общий для всех подписок в ответе.
+        """
+        return FavoriteSerializer(many=True)
@@ -0,0 +1,23 @@
+import uuid
+
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from recipes.models import Ingredient, Tag
+
+REFERENCE_VERSION_KEY = 'reference_version:{}'
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def bump_reference_version(sender, **kwargs):
+    """
+    Сменить версию справочника после изменения тега или ингредиента.
+    """
+    cache.set(
+        REFERENCE_VERSION_KEY.format(sender._meta.model_name),
+        uuid.uuid4().hex,
+        None
+    )
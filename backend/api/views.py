@@ -1,13 +1,21 @@
+import hashlib
 import io
+import os
+import uuid
 
-from django.apps import apps
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Max, Prefetch, Sum
+from django.http import FileResponse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet as DjoserUserViewSet
-from recipes.models import (Ingredient, Recipe, RecipeIngredientAmount,
-                            Subscription, Tag)
+from recipes.models import (Favorite, Ingredient, Recipe,
+                            RecipeIngredientAmount, ShoppingCart, Subscription,
+                            Tag)
 from reportlab.pdfbase import pdfmetrics
 from reportlab.pdfbase.ttfonts import TTFont
 from reportlab.pdfgen import canvas
@@ -22,18 +30,46 @@ from .permissions import IsOwner, ReadOnly
 from .serializers import (FavoriteSerializer, IngredientSerializer,
                           RecipeSerializer, RecipeWriteSerializer,
                           SubscriptionSerializer, TagSerializer)
+from .signals import REFERENCE_VERSION_KEY
 
 User = get_user_model()
 
+SHOPPING_CART_CACHE_TIMEOUT = 60 * 60
+
+if 'Georgia' not in pdfmetrics.getRegisteredFontNames():
+    pdfmetrics.registerFont(
+        TTFont('Georgia', os.path.join(settings.BASE_DIR, 'georgia.ttf'))
+    )
+
+
+def reference_etag(model):
+    """
+    ETag справочника: версия из кэша и сводка по записям в базе.
+    """
+    def etag_func(request, *args, **kwargs):
+        version = cache.get_or_set(
+            REFERENCE_VERSION_KEY.format(model._meta.model_name),
+            lambda: uuid.uuid4().hex,
+            None
+        )
+        aggregate = model.objects.aggregate(
+            count=Count('id'), last=Max('id'), updated=Max('updated')
+        )
+        fingerprint = repr((version, sorted(aggregate.items())))
+        return hashlib.md5(fingerprint.encode()).hexdigest()
+    return etag_func
+
 
 class UserViewSet(DjoserUserViewSet):
+    lookup_value_regex = r'\d+'
+
     @action(methods=['post', 'delete'], detail=True,
             permission_classes=(permissions.IsAuthenticated,))
     def subscribe(self, request, id=None):
         user = request.user
-        author = get_object_or_404(User, id=id)
 
         if request.method == 'POST':
+            author = get_object_or_404(User.objects.only('id'), id=id)
             if user == author:
                 raise serializers.ValidationError(
                     {
@@ -42,8 +78,13 @@ class UserViewSet(DjoserUserViewSet):
                         ]
                     }
                 )
-            elif Subscription.objects.filter(user=user,
-                                             author=author).exists():
+
+            try:
+                with transaction.atomic():
+                    subscription = Subscription.objects.create(
+                        user=user, author=author
+                    )
+            except IntegrityError:
                 raise serializers.ValidationError(
                     {
                         "author": [
@@ -51,9 +92,8 @@ class UserViewSet(DjoserUserViewSet):
                         ]
                     }
                 )
-
-            subscription, _ = Subscription.objects.get_or_create(
-                user=user, author=author
+            subscription = Subscription.objects.with_recipes().get(
+                pk=subscription.pk
             )
             serializer = SubscriptionSerializer(
                 subscription,
@@ -66,6 +106,7 @@ class UserViewSet(DjoserUserViewSet):
             deleted, _ = user.subscriptions.filter(author_id=id).delete()
             if deleted:
                 return Response(status=status.HTTP_204_NO_CONTENT)
+            get_object_or_404(User.objects.only('id'), id=id)
             response = {"errors": 'Автор не найден в подписках.'}
             return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
@@ -79,9 +120,11 @@ class SubscriptionViewSet(ListViewSet):
 
     def get_queryset(self):
         user = self.request.user
-        return user.subscriptions.all()
+        return user.subscriptions.with_recipes()
 
 
+@method_decorator(condition(etag_func=reference_etag(Tag)),
+                  name='dispatch')
 class TagViewSet(ListRetrieveViewSet):
     """
     Вьюсет для получения тега и списка тегов.
@@ -92,6 +135,8 @@ class TagViewSet(ListRetrieveViewSet):
     pagination_class = None
 
 
+@method_decorator(condition(etag_func=reference_etag(Ingredient)),
+                  name='dispatch')
 class IngredientViewSet(ListRetrieveViewSet):
     """
     Вьюсет для получения ингредиента и списка ингредиентов.
@@ -121,14 +166,29 @@ class RecipeViewSet(viewsets.ModelViewSet):
             'is_in_shopping_cart'
         )
 
+        marked_recipes = Recipe.marked.select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredientamount',
+                queryset=RecipeIngredientAmount.objects.select_related(
+                    'ingredient'
+                )
+            )
+        ).favorited_shoppingcart(user)
+        if self.action == 'list':
+            marked_recipes = marked_recipes.only(
+                'id', 'name', 'image', 'text', 'cooking_time', 'author',
+                'author__email', 'author__username',
+                'author__first_name', 'author__last_name'
+            )
         if user.is_authenticated:
-            marked_recipes = Recipe.marked.favorited_shoppingcart(user)
             if is_favorited_filter == '1':
-                return marked_recipes.filter(is_favorited=True).all()
+                return marked_recipes.filter(favorite__user=user)
             elif is_in_shopping_cart_filter == '1':
-                return marked_recipes.filter(is_in_shopping_cart=True).all()
-            return marked_recipes
-        return Recipe.objects.all()
+                return marked_recipes.filter(shoppingcart__user=user)
+        return marked_recipes
 
     def get_serializer_class(self):
         if self.request.method == 'GET':
@@ -144,35 +204,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
         Выполнить добавление или удаление записи в соответствующей таблице.
         """
         user = request.user
-        model = apps.get_model(app_label='recipes', model_name=model)
-
-        # В соответствии со спецификацией возвращаем 201, 400, 401.
-        try:
-            recipe = Recipe.objects.get(pk=pk)
-        except Recipe.DoesNotExist:
-            response = {"errors": 'Рецепт не найден.'}
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
         if request.method == 'POST':
-            item, created = model.objects.get_or_create(
-                user=user,
-                recipe=recipe
-            )
-            if created:
-                serializer = FavoriteSerializer(recipe)
-                return Response(serializer.data,
-                                status=status.HTTP_201_CREATED)
-            response = {"errors": f'Рецепт уже в {text}.'}
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-
-        try:
-            item = related.get(recipe_id=pk)
-        except model.DoesNotExist:
-            response = {"errors": f'Рецепт не найден в {text}.'}
-            return Response(response, status=status.HTTP_400_BAD_REQUEST)
-
-        item.delete()
-        return Response(status=status.HTTP_204_NO_CONTENT)
+            # В соответствии со спецификацией возвращаем 201, 400, 401.
+            try:
+                recipe = Recipe.objects.only(
+                    'id', 'name', 'image', 'cooking_time'
+                ).get(pk=pk)
+            except Recipe.DoesNotExist:
+                response = {"errors": 'Рецепт не найден.'}
+                return Response(response,
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            try:
+                with transaction.atomic():
+                    model.objects.create(user=user, recipe=recipe)
+            except IntegrityError:
+                response = {"errors": f'Рецепт уже в {text}.'}
+                return Response(response,
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            serializer = FavoriteSerializer(recipe)
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+        deleted, _ = related.filter(recipe_id=pk).delete()
+        if deleted:
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        response = {"errors": f'Рецепт не найден в {text}.'}
+        return Response(response, status=status.HTTP_400_BAD_REQUEST)
 
     @action(methods=['post', 'delete'], detail=True,
             permission_classes=(permissions.IsAuthenticated,))
@@ -183,7 +242,7 @@ class RecipeViewSet(viewsets.ModelViewSet):
         queryset = request.user.recipes_favorite_related
         return self.favorite_shopping_cart(request=request,
                                            pk=pk,
-                                           model='Favorite',
+                                           model=Favorite,
                                            related=queryset,
                                            text='избранном')
 
@@ -196,10 +255,21 @@ class RecipeViewSet(viewsets.ModelViewSet):
         queryset = request.user.recipes_shoppingcart_related
         return self.favorite_shopping_cart(request=request,
                                            pk=pk,
-                                           model='ShoppingCart',
+                                           model=ShoppingCart,
                                            related=queryset,
                                            text='списке покупок')
 
+    def get_pdf_page(self, p):
+        """
+        Начать страницу списка покупок: заголовок и текстовый объект.
+        """
+        p.setFont('Georgia', 28)
+        x, y = 80, 730
+        p.drawString(x, y + 30, 'Список покупок')
+        text = p.beginText(x, y - 12)
+        text.setFont('Georgia', 16, leading=25)
+        return text
+
     def get_pdf(self, shopping_cart):
         """
         Сформировать список покупок.
@@ -207,21 +277,34 @@ class RecipeViewSet(viewsets.ModelViewSet):
         buffer = io.BytesIO()
         p = canvas.Canvas(buffer)
 
-        pdfmetrics.registerFont(TTFont('Georgia', 'georgia.ttf'))
-        p.setFont('Georgia', 28)
-        x, y = 80, 730
-        p.drawString(x, y + 30, 'Список покупок')
-        for ingredient in shopping_cart:
-            name, measurement_unit, amount = ingredient.values()
-            p.setFont('Georgia', 16)
-            p.drawString(x, y - 12, f'• {name}, {measurement_unit}   {amount}')
-            y = y - 25
+        text = self.get_pdf_page(p)
+        for name, measurement_unit, amount in shopping_cart:
+            if text.getY() < 50:
+                p.drawText(text)
+                p.showPage()
+                text = self.get_pdf_page(p)
+            text.textLine(f'• {name}, {measurement_unit}   {amount}')
+        p.drawText(text)
         p.showPage()
         p.save()
-        pdf = buffer.getvalue()
-        buffer.close()
+        buffer.seek(0)
+
+        return buffer
 
-        return pdf
+    def get_cached_pdf(self, shopping_cart):
+        """
+        Взять список покупок из кеша по его содержимому или сформировать.
+        Кеш хранит байты, поэтому свежий буфер отдаётся как есть,
+        а закешированные байты оборачиваются в буфер один раз.
+        """
+        fingerprint = hashlib.sha256(repr(shopping_cart).encode()).hexdigest()
+        key = f'shopping_cart:{fingerprint}'
+        pdf = cache.get(key)
+        if pdf is not None:
+            return io.BytesIO(pdf)
+        buffer = self.get_pdf(shopping_cart)
+        cache.set(key, buffer.getvalue(), SHOPPING_CART_CACHE_TIMEOUT)
+        return buffer
 
     @action(methods=['get'], detail=False,
             permission_classes=(permissions.IsAuthenticated,))
@@ -229,18 +312,13 @@ class RecipeViewSet(viewsets.ModelViewSet):
         """
         Скачать список покупок.
         """
-        user = request.user
-        recipes = user.recipes_shoppingcart_related.all().values_list(
-            'recipe__pk', flat=True
-        )
         shopping_cart = RecipeIngredientAmount.objects.filter(
-            recipe__in=recipes
-        ).values(
+            recipe__shoppingcart__user=request.user
+        ).values_list(
             'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
+        ).annotate(amount=Sum('amount')).order_by('ingredient__name')
 
-        pdf = self.get_pdf(shopping_cart)
-        response = HttpResponse(pdf, content_type='application/pdf')
-        content_disposition = 'attachment; filename="shopping_cart.pdf"'
-        response['Content-Disposition'] = content_disposition
-        return response
+        pdf = self.get_cached_pdf(list(shopping_cart))
+        return FileResponse(pdf, as_attachment=True,
+                            filename='shopping_cart.pdf',
+                            content_type='application/pdf')
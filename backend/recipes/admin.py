@@ -23,21 +23,33 @@ class IngredientAdmin(admin.ModelAdmin):
     list_display_links = (
         'name',
     )
-    list_filter = ('name',)
+    search_fields = ('name',)
 
 
 class RecipeIngredientAmountAdmin(admin.ModelAdmin):
     list_display = (
         'id',
-        'recipe',
-        'ingredient',
+        'recipe_name',
+        'ingredient_name',
         'amount',
     )
     list_display_links = (
         'id',
-        'ingredient',
+        'ingredient_name',
     )
     list_filter = ('recipe',)
+    list_select_related = ('recipe', 'ingredient')
+    raw_id_fields = ('recipe', 'ingredient')
+
+    def recipe_name(self, obj):
+        return obj.recipe.name
+    recipe_name.short_description = 'Рецепт'
+    recipe_name.admin_order_field = 'recipe__name'
+
+    def ingredient_name(self, obj):
+        return obj.ingredient.name
+    ingredient_name.short_description = 'Ингредиент'
+    ingredient_name.admin_order_field = 'ingredient__name'
 
 
 class RecipeAdmin(admin.ModelAdmin):
@@ -50,7 +62,10 @@ class RecipeAdmin(admin.ModelAdmin):
     list_display_links = (
         'name',
     )
-    list_filter = ('author', 'name', 'tags')
+    list_filter = ('tags',)
+    search_fields = ('name', 'author__username')
+    list_select_related = ('author',)
+    raw_id_fields = ('author',)
 
 
 class SubscriptionAdmin(admin.ModelAdmin):
@@ -59,6 +74,8 @@ class SubscriptionAdmin(admin.ModelAdmin):
         'user',
         'author',
     )
+    list_select_related = ('user', 'author')
+    raw_id_fields = ('user', 'author')
 
 
 class FavoriteAdmin(admin.ModelAdmin):
@@ -68,6 +85,8 @@ class FavoriteAdmin(admin.ModelAdmin):
         'recipe',
     )
     list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
 
 
 class ShoppingCartAdmin(admin.ModelAdmin):
@@ -77,6 +96,8 @@ class ShoppingCartAdmin(admin.ModelAdmin):
         'recipe',
     )
     list_filter = ('user',)
+    list_select_related = ('user', 'recipe')
+    raw_id_fields = ('user', 'recipe')
 
 
 admin.site.register(Tag, TagAdmin)
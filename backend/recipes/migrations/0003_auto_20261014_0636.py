@@ -0,0 +1,17 @@
+# Generated by Django 2.2.19 on 2026-10-14 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0002_auto_20220419_1539'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='recipeingredientamount',
+            index=models.Index(fields=['recipe', 'ingredient', 'amount'], name='recipe_ingredient_amount_idx'),
+        ),
+    ]
@@ -21,6 +21,11 @@ class Tag(models.Model):
         help_text='HEX-код цвета вида #RRGGBB'
     )
     slug = models.SlugField(unique=True)
+    updated = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Тег'
@@ -43,6 +48,11 @@ class Ingredient(models.Model):
         max_length=200,
         verbose_name='Единица измерения'
     )
+    updated = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        verbose_name='Дата изменения'
+    )
 
     class Meta:
         verbose_name = 'Ингредиент'
@@ -55,6 +65,13 @@ class Ingredient(models.Model):
                 name='unique_ingredient_measurement'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['name'],
+                name='ingredient_name_prefix_idx',
+                opclasses=['varchar_pattern_ops']
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -62,6 +79,15 @@ class Ingredient(models.Model):
 
 class RecipeQuerySet(models.QuerySet):
     def favorited_shoppingcart(self, user):
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()
+                ),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()
+                )
+            )
         return self.annotate(
             is_favorited=models.Exists(
                 Favorite.objects.filter(
@@ -161,10 +187,34 @@ class RecipeIngredientAmount(models.Model):
         verbose_name = 'Количество'
         verbose_name_plural = 'Количества ингредиентов по рецептам'
 
+        indexes = [
+            models.Index(
+                fields=['recipe', 'ingredient', 'amount'],
+                name='recipe_ingredient_amount_idx'
+            ),
+        ]
+
     def __str__(self):
         return f'{self.recipe} {self.ingredient} {self.amount}'
 
 
+class SubscriptionQuerySet(models.QuerySet):
+    def with_recipes(self):
+        return self.select_related('author').prefetch_related(
+            models.Prefetch(
+                'author__recipes',
+                queryset=Recipe.objects.only(
+                    'id', 'author', 'name', 'image', 'cooking_time'
+                )
+            )
+        ).annotate(
+            recipes_count=models.Count('author__recipes'),
+            is_subscribed=models.Value(
+                True, output_field=models.BooleanField()
+            )
+        )
+
+
 class Subscription(models.Model):
     """
     Модель подписки.
@@ -181,6 +231,7 @@ class Subscription(models.Model):
         related_name='users',
         verbose_name='Автор'
     )
+    objects = SubscriptionQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Подписка'
@@ -200,6 +251,18 @@ class Subscription(models.Model):
     def __str__(self):
         return f'{self.user} {self.author}'
 
+    @classmethod
+    def bulk_follow(cls, user, author_ids):
+        """
+        Подписать пользователя на авторов одним запросом, пропуская дубли.
+        """
+        author_ids = {int(author_id) for author_id in author_ids} - {user.id}
+        return cls.objects.bulk_create(
+            [cls(user=user, author_id=author_id) for author_id in author_ids],
+            batch_size=500,
+            ignore_conflicts=True
+        )
+
 
 class FavoriteShoppingCartBaseModel(models.Model):
     """
@@ -223,6 +286,17 @@ class FavoriteShoppingCartBaseModel(models.Model):
     def __str__(self):
         return f'{self.user} {self.recipe}'
 
+    @classmethod
+    def bulk_add(cls, user, recipe_ids):
+        """
+        Добавить рецепты пользователю одним запросом, пропуская дубли.
+        """
+        return cls.objects.bulk_create(
+            [cls(user=user, recipe_id=recipe_id) for recipe_id in recipe_ids],
+            batch_size=500,
+            ignore_conflicts=True
+        )
+
 
 class Favorite(FavoriteShoppingCartBaseModel):
     """